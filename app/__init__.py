@@ -1,32 +1,45 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
-from .config import config_by_name # This imports your config_by_name dictionary
+from .config import config_by_name, config_keys # This imports your config_by_name dictionary
 
 # Initialize extensions globally but without an app instance yet
 db = SQLAlchemy()
 migrate = Migrate()
 cors = CORS() # Initialize CORS instance
 
+# Apps already built by create_app, keyed by config_name (only used when CHECKPOINTX_CACHE_APP is set)
+_app_cache = {}
+
 def create_app(config_name='default'): # config_name can be 'dev', 'prod', 'test'
     """
     Application factory function.
+
+    Setting the CHECKPOINTX_CACHE_APP environment variable makes repeated calls with the
+    same config_name return the app built the first time (useful for test suites).
+    Tests that mutate app.config must not enable it, since the app is shared.
     """
+    cache_app = bool(os.environ.get('CHECKPOINTX_CACHE_APP'))
+    if cache_app and config_name in _app_cache:
+        return _app_cache[config_name]
+
     app = Flask(__name__)
     
-    # Load configuration using the name (e.g., 'dev', 'prod')
-    current_config_object = config_by_name[config_name]
-    app.config.from_object(current_config_object)
+    # Load configuration using the name (e.g., 'dev', 'prod'); unknown names fall back to the default
+    current_config_object = config_by_name.get(config_name)
+    if current_config_object is None:
+        app.logger.warning("Unknown config name '%s', using the default configuration.", config_name)
+        current_config_object = config_by_name['default']
+    # Same as app.config.from_object, but the key list is computed once per config class
+    app.config.update((key, getattr(current_config_object, key)) for key in config_keys(current_config_object))
 
-    # --- DEBUG PRINT for SQLALCHEMY_DATABASE_URI ---
-    # This will show the exact URI that Flask is configured with
-    print(f"DEBUG [__init__.py]: SQLALCHEMY_DATABASE_URI from Flask app.config: {app.config.get('SQLALCHEMY_DATABASE_URI')}")
-    # --- END DEBUG PRINT ---
+    # Shows the exact URI that Flask is configured with (only emitted at DEBUG level)
+    app.logger.debug("SQLALCHEMY_DATABASE_URI from Flask app.config: %s", app.config.get('SQLALCHEMY_DATABASE_URI'))
 
-    # Call init_app on the Config class itself if you have app-specific config logic there
-    if hasattr(current_config_object, 'init_app') and callable(getattr(current_config_object, 'init_app')):
-        current_config_object.init_app(app) # Pass the app instance to the config's init_app
+    # Call init_app on the Config class itself (always defined, Config provides a no-op default)
+    current_config_object.init_app(app) # Pass the app instance to the config's init_app
 
     # Initialize extensions with the app instance
     # For this "fresh start" test, we are NOT passing engine_options to db.init_app()
@@ -35,16 +48,18 @@ def create_app(config_name='default'): # config_name can be 'dev', 'prod', 'test
     migrate.init_app(app, db)
     cors.init_app(app) # Initialize CORS with the app. You might add specific origins later.
 
-    # Import and Register your Blueprints
-    from .routes import main_routes as main_blueprint # Assuming main_routes is your Blueprint in routes.py
-    app.register_blueprint(main_blueprint)
-    # If you have other blueprints, register them here as well
-    # Example: from .api_routes import api_bp
-    # app.register_blueprint(api_bp, url_prefix='/api')
-
     # Ensure models are imported so SQLAlchemy/Migrate knows about them.
-    # This is usually done within an app context or after db is initialized.
-    with app.app_context():
-        from . import models # This will execute models.py and register your models
+    # Registering the tables only needs db.metadata, not an active app context.
+    from . import models # This will execute models.py and register your models
+
+    # Import and Register your Blueprints (skipped for CLI-only apps, see Config.SKIP_BLUEPRINTS)
+    if not app.config.get('SKIP_BLUEPRINTS'):
+        from .routes import main_routes as main_blueprint # Assuming main_routes is your Blueprint in routes.py
+        app.register_blueprint(main_blueprint)
+        # If you have other blueprints, register them here as well
+        # Example: from .api_routes import api_bp
+        # app.register_blueprint(api_bp, url_prefix='/api')
 
+    if cache_app:
+        _app_cache[config_name] = app
     return app
\ No newline at end of file
@@ -1,31 +1,88 @@
+import functools
+import logging
 import os
-from dotenv import load_dotenv
-from cryptography.fernet import Fernet
+import types
 
-# --- Path Setup for .env (primarily for local development, but harmless in prod) ---
-# This part is still useful if you ever want to test production settings locally with a .env file.
-current_script_path = os.path.abspath(__file__)
-app_dir = os.path.dirname(current_script_path)
-backend_root_dir = os.path.dirname(app_dir)
-dotenv_path = os.path.join(backend_root_dir, '.env')
+# Get a logger for this module
+config_logger = logging.getLogger(__name__)
 
-if os.path.exists(dotenv_path):
-    load_dotenv(dotenv_path)
+# --- Path Setup for .env (local development only) ---
+# The .env file is never read when FLASK_ENV=production or FLASK_CONFIG=prod (see below), so
+# `FLASK_CONFIG=prod python run.py` will not pick up DATABASE_URL/SECRET_KEY/ENCRYPTION_KEY from it.
+# To test production settings locally, export those variables in the shell, or keep FLASK_ENV and
+# FLASK_CONFIG at values other than production/prod so the .env file is loaded.
+# __file__ is already absolute for normal imports, so abspath (and its getcwd) is only needed as a fallback.
+current_script_path = __file__ if os.path.isabs(__file__) else os.path.abspath(__file__)
+backend_root_dir = os.path.dirname(os.path.dirname(current_script_path))
+dotenv_path = f"{backend_root_dir}{os.sep}.env"
+
+# Production platforms (Render) inject the environment directly, so the .env file
+# is only parsed outside production (FLASK_ENV=production or FLASK_CONFIG=prod), and
+# python-dotenv isn't even imported there. override=False keeps injected values winning.
+# The _DOTENV_LOADED marker is inherited by child processes (e.g. the reloader), which
+# already have the .env values in their environment and don't need to parse it again.
+_FLASK_ENV = os.environ.get('FLASK_ENV')
+_IS_PRODUCTION_ENV = _FLASK_ENV == 'production' or os.environ.get('FLASK_CONFIG') == 'prod'
+# load_dotenv checks for the file itself and returns False when it is missing (or empty).
+_DOTENV_LOADED = os.environ.get('CHECKPOINTX_DOTENV_LOADED') == '1'
+if not _DOTENV_LOADED and not _IS_PRODUCTION_ENV:
+    from dotenv import load_dotenv
+    if load_dotenv(dotenv_path, override=False):
+        os.environ['CHECKPOINTX_DOTENV_LOADED'] = '1'
+        _DOTENV_LOADED = True
+
+# --- Environment snapshot ---
+# Read the environment once (after .env has been applied) so the config classes
+# and the cipher setup below don't each go back to os.getenv(). Only the variables
+# this module uses are captured, in a read-only mapping; add new keys to _ENV_KEYS.
+_ENV_KEYS = (
+    'SECRET_KEY', 'ENCRYPTION_KEY', 'DATABASE_URL', 'SKIP_BLUEPRINTS',
+    'RESEND_API_KEY', 'ADMIN_EMAIL', 'AFRICASTALKING_USERNAME', 'AFRICASTALKING_API_KEY',
+    'FIREBASE_API_KEY', 'FIREBASE_AUTH_DOMAIN', 'FIREBASE_PROJECT_ID',
+)
+_ENV = types.MappingProxyType({key: os.environ.get(key) for key in _ENV_KEYS})
+# Bound method of the snapshot: _env('X') / _env('X', default) is a plain C-level dict lookup.
+_env = _ENV.get
+
+# Read once and shared by Config.ENCRYPTION_KEY and the cipher setup below.
+_ENCRYPTION_KEY = _env('ENCRYPTION_KEY')
+
+# Scheme SQLAlchemy should see, and the (scheme to replace, replacement) pairs applied by _normalize_db_url
+_SQLALCHEMY_PG_SCHEME = 'postgresql+psycopg2://'
+_SCHEME_MAP = (
+    ('postgres://', _SQLALCHEMY_PG_SCHEME),
+    ('postgresql://', _SQLALCHEMY_PG_SCHEME),
+)
+
+def _normalize_db_url(url):
+    """Rewrites Render's 'postgres://' (or bare 'postgresql://') scheme to the one SQLAlchemy expects."""
+    # Common case first: already-correct (or missing) URLs return after a single prefix check.
+    if not url or url.startswith(_SQLALCHEMY_PG_SCHEME):
+        return url
+    for old, new in _SCHEME_MAP:
+        if url.startswith(old):
+            return new + url.removeprefix(old)
+    return url
 
 class Config:
     """Base configuration class."""
+    # Config classes are only read as attribute containers (app.config.from_object); never give instances a __dict__.
+    __slots__ = ()
+
     # Load all settings from environment variables.
     # Production environments like Render should provide these.
-    SECRET_KEY = os.getenv('SECRET_KEY')
+    SECRET_KEY = _env('SECRET_KEY')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
-    RESEND_API_KEY = os.getenv('RESEND_API_KEY')
-    ADMIN_EMAIL = os.getenv('ADMIN_EMAIL')
-    AFRICASTALKING_USERNAME = os.getenv('AFRICASTALKING_USERNAME')
-    AFRICASTALKING_API_KEY = os.getenv('AFRICASTALKING_API_KEY')
-    FIREBASE_API_KEY = os.getenv('FIREBASE_API_KEY')
-    FIREBASE_AUTH_DOMAIN = os.getenv('FIREBASE_AUTH_DOMAIN')
-    FIREBASE_PROJECT_ID = os.getenv('FIREBASE_PROJECT_ID')
+    ENCRYPTION_KEY = _ENCRYPTION_KEY
+    RESEND_API_KEY = _env('RESEND_API_KEY')
+    ADMIN_EMAIL = _env('ADMIN_EMAIL')
+    AFRICASTALKING_USERNAME = _env('AFRICASTALKING_USERNAME')
+    AFRICASTALKING_API_KEY = _env('AFRICASTALKING_API_KEY')
+    FIREBASE_API_KEY = _env('FIREBASE_API_KEY')
+    FIREBASE_AUTH_DOMAIN = _env('FIREBASE_AUTH_DOMAIN')
+    FIREBASE_PROJECT_ID = _env('FIREBASE_PROJECT_ID')
+    # Management commands (e.g. `flask db upgrade`) never serve HTTP and can skip importing the routes.
+    SKIP_BLUEPRINTS = _env('SKIP_BLUEPRINTS') == '1'
 
     # Default SQLALCHEMY_DATABASE_URI will be overridden by ProductionConfig
     SQLALCHEMY_DATABASE_URI = None
@@ -37,57 +94,102 @@ class Config:
 
 class ProductionConfig(Config):
     """Production configuration."""
+    __slots__ = ()
     DEBUG = False
     
-    # Production ALWAYS uses the DATABASE_URL from the environment (set by Render for its PostgreSQL)
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
+    # Production ALWAYS uses the DATABASE_URL from the environment (set by Render for its PostgreSQL).
+    # Render's default PostgreSQL URL starts with 'postgres://', which SQLAlchemy no longer accepts,
+    # so it (and a bare 'postgresql://') is normalized to 'postgresql+psycopg2://'.
+    SQLALCHEMY_DATABASE_URI = _normalize_db_url(_env('DATABASE_URL'))
 
-    # This is a critical check. If DATABASE_URL is not set on Render, the app will fail to start.
-    if not SQLALCHEMY_DATABASE_URI:
-        raise ValueError("CRITICAL_ERROR: No DATABASE_URL set for production environment!")
-    
-    # Render's default PostgreSQL URL starts with 'postgres://'.
-    # SQLAlchemy and psycopg2 work better with 'postgresql://' or 'postgresql+psycopg2://'.
-    # This code replaces it to ensure compatibility.
-    if SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
-        SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace('postgres://', 'postgresql://', 1)
-    
-    # This print statement is crucial for debugging your Render deployment.
-    # It will show in the logs which database your app is trying to connect to.
-    print(f"INFO [ProductionConfig]: Using production database URI: {SQLALCHEMY_DATABASE_URI}")
+    @classmethod
+    def init_app(cls, app):
+        # Validation runs when an app is actually built with this config, not when config.py is imported.
+        super().init_app(app)
+
+        # This is a critical check. If DATABASE_URL is not set on Render, the app will fail to start.
+        if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+            raise ValueError("CRITICAL_ERROR: No DATABASE_URL set for production environment!")
+
+        # Useful when debugging a Render deployment: shows which database the app is trying to connect to.
+        config_logger.info("ProductionConfig: Using production database URI: %s", app.config['SQLALCHEMY_DATABASE_URI'])
 
-    # Ensure other critical environment variables are set
-    if not os.getenv('SECRET_KEY'):
-        raise ValueError("CRITICAL_ERROR: Production SECRET_KEY is not set!")
-    if not os.getenv('ENCRYPTION_KEY'):
-        raise ValueError("CRITICAL_WARNING: Production ENCRYPTION_KEY is not set!")
+        # Ensure other critical environment variables are set
+        if not app.config.get('SECRET_KEY'):
+            raise ValueError("CRITICAL_ERROR: Production SECRET_KEY is not set!")
+        if not app.config.get('ENCRYPTION_KEY'):
+            raise ValueError("CRITICAL_WARNING: Production ENCRYPTION_KEY is not set!")
+        # A key that builds no cipher would make the models store fingerprint templates as plain text.
+        if get_fernet_cipher() is None:
+            raise ValueError("CRITICAL_ERROR: Production ENCRYPTION_KEY is set but no Fernet cipher could be built from it!")
 
 # The dictionary now only points to ProductionConfig.
-# The `create_app` function in your app/__init__.py will need to be adjusted
-# to not expect 'dev' or 'test', or to default to 'prod'.
-config_by_name = dict(
-    prod=ProductionConfig,
-    default=ProductionConfig  # Default to production config
-)
+# `create_app` falls back to 'default' for names not listed here (e.g. 'dev' from run.py).
+# Wrapped in a read-only view so nothing (e.g. a test fixture) can mutate the registry at runtime.
+config_by_name = types.MappingProxyType({
+    'prod': ProductionConfig,
+    'default': ProductionConfig,  # Default to production config
+})
+
+@functools.lru_cache(maxsize=None)
+def config_keys(config_class):
+    """Returns the UPPERCASE setting names of a config class (what app.config.from_object would copy)."""
+    return tuple(key for key in dir(config_class) if key.isupper())
+
+# --- Encryption key ---
+# Encoded once here so the cipher builder and services share the same bytes object.
+_ENCRYPTION_KEY_BYTES = _ENCRYPTION_KEY.encode() if _ENCRYPTION_KEY else None
+
+def get_encryption_key_bytes():
+    """Returns ENCRYPTION_KEY as bytes, or None if it is not set."""
+    return _ENCRYPTION_KEY_BYTES
 
 # --- Fernet Cipher Initialization ---
-_fernet_cipher = None
-_env_encryption_key = os.getenv('ENCRYPTION_KEY')
+class _RFernetCipher:
+    """Adapts rfernet.Fernet (str tokens) to cryptography's bytes-in/bytes-out Fernet interface."""
+    __slots__ = ('_fernet',)
+
+    def __init__(self, fernet):
+        self._fernet = fernet
+
+    def encrypt(self, data):
+        token = self._fernet.encrypt(data)
+        return token.encode() if isinstance(token, str) else token
 
-if _env_encryption_key:
+    def decrypt(self, token):
+        return self._fernet.decrypt(token.decode() if isinstance(token, bytes) else token)
+
+# The cipher is built on first use and memoized, so callers on hot paths
+# (fingerprint encrypt/decrypt) get the same instance back without any global
+# bookkeeping.
+@functools.lru_cache(maxsize=1)
+def get_fernet_cipher():
+    """Returns the process-wide Fernet cipher, or None if it is not configured."""
+    if not _ENCRYPTION_KEY_BYTES:
+        config_logger.debug("ENCRYPTION_KEY not found, Fernet cipher not initialized.")
+        return None
+    # Prefer the Rust-backed rfernet when it is installed (optional, several times faster on short
+    # payloads). Its tokens follow the same Fernet spec, so data written by either backend stays readable.
+    try:
+        import rfernet
+    except ImportError:
+        rfernet = None
+    if rfernet is not None:
+        try:
+            cipher = _RFernetCipher(rfernet.Fernet(_ENCRYPTION_KEY))
+            config_logger.debug("Fernet cipher initialized successfully (rfernet backend).")
+            return cipher
+        except Exception as e:
+            config_logger.warning("rfernet could not use ENCRYPTION_KEY, falling back to cryptography. Error: %s", e)
     try:
-        _fernet_cipher = Fernet(_env_encryption_key.encode())
-        print("DEBUG [config.py]: Fernet cipher initialized successfully.")
+        # Imported here so processes that never encrypt (CLI, migrations) skip loading cryptography.
+        from cryptography.fernet import Fernet
+        cipher = Fernet(_ENCRYPTION_KEY_BYTES)
+        config_logger.debug("Fernet cipher initialized successfully.")
+        return cipher
     except ImportError:
-        print("WARNING [config.py]: 'cryptography' library not installed. Encryption will not work.")
-        _fernet_cipher = None
+        config_logger.warning("'cryptography' library not installed. Encryption will not work.")
+        return None
     except Exception as e:
-        print(f"WARNING [config.gpy]: Invalid ENCRYPTION_KEY format. Fernet cipher failed. Error: {e}")
-        _fernet_cipher = None
-else:
-    print("DEBUG [config.py]: ENCRYPTION_KEY not found, Fernet cipher not initialized.")
-
-def get_fernet_cipher():
-    """Returns the globally initialized Fernet cipher instance."""
-    global _fernet_cipher
-    return _fernet_cipher
\ No newline at end of file
+        config_logger.warning("Invalid ENCRYPTION_KEY format. Fernet cipher failed. Error: %s", e)
+        return None
@@ -1,13 +1,33 @@
 from . import db
 from datetime import datetime
-from .config import get_fernet_cipher # For fingerprint encryption/decryption
+from .config import get_fernet_cipher, get_encryption_key_bytes # For fingerprint encryption/decryption
 from uuid import uuid4 # <--- ADD THIS IMPORT or ensure it's present
-import os
 import logging
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import expression
 
 # Get a logger for this module
 model_logger = logging.getLogger(__name__)
 
+
+# Server-side default for the naive UTC DateTime columns. PostgreSQL's now() follows the session
+# TimeZone, so it is pinned to UTC there; SQLite's CURRENT_TIMESTAMP is already UTC. This keeps
+# database-filled values on the same clock as the datetime.utcnow values written from Python.
+class utcnow(expression.FunctionElement):
+    type = db.DateTime()
+    inherit_cache = True
+
+@compiles(utcnow, 'postgresql')
+def _pg_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+# Whether ENCRYPTION_KEY was configured (read once from config's environment snapshot, not per template write)
+_HAS_ENCRYPTION_KEY = get_encryption_key_bytes() is not None
+
 class User(db.Model):
     __tablename__ = 'users'
 
@@ -17,43 +37,55 @@ class User(db.Model):
     phone = db.Column(db.String(20), nullable=True) # unique=True will be handled by __table_args__
     email = db.Column(db.String(120), nullable=True, unique=True)
     
-    # --- MODIFIED THIS LINE ---
-    fallback_id = db.Column(db.String(36), default=lambda: str(uuid4()), nullable=False, unique=True)
-    # --- END MODIFICATION ---
+    # New IDs are 32-char hex (no hyphen formatting); the column stays 36 wide for existing hyphenated IDs.
+    fallback_id = db.Column(db.String(36), default=lambda: uuid4().hex, nullable=False, unique=True)
     
     _fingerprint_template_1 = db.Column("fingerprint_template_1", db.Text, nullable=True)
     _fingerprint_template_2 = db.Column("fingerprint_template_2", db.Text, nullable=True)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Insert timestamps are filled in by the database, so inserts don't build/bind a Python datetime
+    created_at = db.Column(db.DateTime, server_default=utcnow())
+    updated_at = db.Column(db.DateTime, server_default=utcnow(), onupdate=datetime.utcnow)
 
-    registrations = db.relationship('Registration', backref='user', lazy='dynamic')
-    check_ins = db.relationship('CheckIn', backref='user', lazy='dynamic')
+    # Collections load on first access and are then cached on the instance (lazy='select');
+    # query Registration/CheckIn directly when filtering is needed.
+    registrations = db.relationship('Registration', backref='user', lazy='select')
+    check_ins = db.relationship('CheckIn', backref='user', lazy='select')
 
     __table_args__ = (db.UniqueConstraint('phone', name='uq_user_phone'),)
 
     @property
     def fingerprint_template_1(self):
+        # Decrypted value is memoized on the instance, keyed by the exact ciphertext object it came from,
+        # so repeated reads within a request skip the Fernet decrypt and a reload/assignment invalidates it.
+        stored = self._fingerprint_template_1
+        cached = self.__dict__.get('_fingerprint_template_1_plain')
+        if cached is not None and cached[0] is stored:
+            return cached[1]
         cipher = get_fernet_cipher()
-        if cipher and self._fingerprint_template_1:
+        if cipher and stored:
             try:
-                return cipher.decrypt(self._fingerprint_template_1.encode()).decode()
+                plain = cipher.decrypt(stored).decode() # Fernet accepts the str token as stored
+                self.__dict__['_fingerprint_template_1_plain'] = (stored, plain)
+                return plain
             except Exception as e: 
                 model_logger.error(f"Failed to decrypt fingerprint_template_1 for user {self.id}: {e}", exc_info=False) # exc_info=False for less verbose logs on decrypt failure
                 return None 
-        return self._fingerprint_template_1
+        return stored
 
     @fingerprint_template_1.setter
     def fingerprint_template_1(self, plain_text_template):
+        self.__dict__.pop('_fingerprint_template_1_plain', None)
         cipher = get_fernet_cipher()
         if cipher and plain_text_template:
             try:
                 self._fingerprint_template_1 = cipher.encrypt(plain_text_template.encode()).decode()
+                self.__dict__['_fingerprint_template_1_plain'] = (self._fingerprint_template_1, plain_text_template)
             except Exception as e: 
                 model_logger.error(f"Failed to encrypt fingerprint_template_1 for user (ID will be set on commit): {e}", exc_info=False)
                 self._fingerprint_template_1 = None 
         elif plain_text_template:
-            if os.getenv('ENCRYPTION_KEY'):
+            if _HAS_ENCRYPTION_KEY:
                 model_logger.warning(f"Storing fingerprint_template_1 as plain text for user (ID to be set) because cipher is not available, despite ENCRYPTION_KEY being set.")
             self._fingerprint_template_1 = plain_text_template
         else:
@@ -61,26 +93,36 @@ class User(db.Model):
 
     @property
     def fingerprint_template_2(self):
+        # Decrypted value is memoized on the instance, keyed by the exact ciphertext object it came from,
+        # so repeated reads within a request skip the Fernet decrypt and a reload/assignment invalidates it.
+        stored = self._fingerprint_template_2
+        cached = self.__dict__.get('_fingerprint_template_2_plain')
+        if cached is not None and cached[0] is stored:
+            return cached[1]
         cipher = get_fernet_cipher()
-        if cipher and self._fingerprint_template_2:
+        if cipher and stored:
             try:
-                return cipher.decrypt(self._fingerprint_template_2.encode()).decode()
+                plain = cipher.decrypt(stored).decode() # Fernet accepts the str token as stored
+                self.__dict__['_fingerprint_template_2_plain'] = (stored, plain)
+                return plain
             except Exception as e: 
                 model_logger.error(f"Failed to decrypt fingerprint_template_2 for user {self.id}: {e}", exc_info=False)
                 return None
-        return self._fingerprint_template_2
+        return stored
 
     @fingerprint_template_2.setter
     def fingerprint_template_2(self, plain_text_template):
+        self.__dict__.pop('_fingerprint_template_2_plain', None)
         cipher = get_fernet_cipher()
         if cipher and plain_text_template:
             try:
                 self._fingerprint_template_2 = cipher.encrypt(plain_text_template.encode()).decode()
+                self.__dict__['_fingerprint_template_2_plain'] = (self._fingerprint_template_2, plain_text_template)
             except Exception as e: 
                 model_logger.error(f"Failed to encrypt fingerprint_template_2 for user (ID to be set): {e}", exc_info=False)
                 self._fingerprint_template_2 = None
         elif plain_text_template:
-            if os.getenv('ENCRYPTION_KEY'):
+            if _HAS_ENCRYPTION_KEY:
                 model_logger.warning(f"Storing fingerprint_template_2 as plain text for user (ID to be set) because cipher is not available, despite ENCRYPTION_KEY being set.")
             self._fingerprint_template_2 = plain_text_template
         else:
@@ -96,9 +138,9 @@ class Event(db.Model):
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
 
-    sessions = db.relationship('Session', backref='event', lazy='dynamic')
-    registrations = db.relationship('Registration', backref='event', lazy='dynamic')
-    check_ins = db.relationship('CheckIn', backref='event', lazy='dynamic')
+    sessions = db.relationship('Session', backref='event', lazy='select')
+    registrations = db.relationship('Registration', backref='event', lazy='select')
+    check_ins = db.relationship('CheckIn', backref='event', lazy='select')
 
     def __repr__(self):
         return f'<Event {self.name}>'
@@ -111,7 +153,7 @@ class Session(db.Model):
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     
-    check_ins = db.relationship('CheckIn', backref='session', lazy='dynamic')
+    check_ins = db.relationship('CheckIn', backref='session', lazy='select')
 
     def __repr__(self):
         return f'<Session {self.name} for Event ID {self.event_id}>'
@@ -121,7 +163,7 @@ class Registration(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
-    registration_date = db.Column(db.DateTime, default=datetime.utcnow)
+    registration_date = db.Column(db.DateTime, server_default=utcnow())
     # is_verified = db.Column(db.Boolean, default=False, nullable=False) 
 
     __table_args__ = (db.UniqueConstraint('user_id', 'event_id', name='uq_user_event_registration'),)
@@ -135,13 +177,17 @@ class CheckIn(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     session_id = db.Column(db.Integer, db.ForeignKey('sessions.id'), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False) 
-    check_in_time = db.Column(db.DateTime, default=datetime.utcnow)
+    check_in_time = db.Column(db.DateTime, server_default=utcnow())
     device_id = db.Column(db.String(100), nullable=True) 
     is_synced = db.Column(db.Boolean, default=False, nullable=False)
     created_at_local = db.Column(db.DateTime, nullable=True)
     method = db.Column(db.String(50), nullable=True)
 
     # __table_args__ = (db.UniqueConstraint('user_id', 'session_id', name='uq_user_session_checkin'),)
+    # Serves the per-user/per-session duplicate check-in lookups in /checkin and /sync
+    __table_args__ = (
+        db.Index('ix_checkins_user_session_time', 'user_id', 'session_id', db.text('check_in_time DESC')),
+    )
 
     def __repr__(self):
         return f'<CheckIn id={self.id} user_id={self.user_id} method={self.method}>'
@@ -151,7 +197,7 @@ class OfflineDevice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     device_uuid = db.Column(db.String(36), unique=True, nullable=False) 
     name = db.Column(db.String(100), nullable=True)
-    last_seen = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, server_default=utcnow(), onupdate=datetime.utcnow)
     last_sync_time = db.Column(db.DateTime, nullable=True)
 
     def __repr__(self):
@@ -1,28 +1,38 @@
 from flask import Blueprint, request, jsonify, current_app
 from .models import db, User, Event, Session, Registration, CheckIn, OfflineDevice as Device
-from .services import FingerprintService, NotificationService
+from .services import get_fingerprint_service, get_notification_service
 from datetime import datetime, timezone
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from sqlalchemy import func, insert
 import io
 import csv
+import logging
+import uuid
+
+try:
+    import orjson # Optional: faster parsing of large /sync payloads (see requirements.txt)
+except ImportError:
+    orjson = None
 
 main_routes = Blueprint('main', __name__)
 
-# Global service instances:
+# Module logger for import-time messages (no app context exists yet, so current_app.logger can't be used)
+routes_logger = logging.getLogger(__name__)
+
+# Global service instances (shared process-wide, see services.get_*_service):
 try:
-    fingerprint_service = FingerprintService()
+    fingerprint_service = get_fingerprint_service()
 except ValueError as e:
-    print(f"WARNING: FingerprintService could not be initialized at import time: {e}")
+    routes_logger.warning("FingerprintService could not be initialized at import time: %s", e)
     fingerprint_service = None
 except Exception as e_fp_service:
-    print(f"WARNING: Unexpected error initializing FingerprintService at import time: {e_fp_service}")
+    routes_logger.warning("Unexpected error initializing FingerprintService at import time: %s", e_fp_service)
     fingerprint_service = None
 
 try:
-    notification_service = NotificationService()
+    notification_service = get_notification_service()
 except Exception as e_notification_service:
-    print(f"WARNING: NotificationService could not be initialized at import time: {e_notification_service}")
+    routes_logger.warning("NotificationService could not be initialized at import time: %s", e_notification_service)
     notification_service = None
 
 @main_routes.route('/register', methods=['POST'])
@@ -98,7 +108,13 @@ def checkin():
         user = None
         # Find user based on identifier
         if data['identifier_type'] == 'fallback_id':
-            user = User.query.filter_by(fallback_id=str(data['identifier_value'])).first()
+            fallback_id = str(data['identifier_value'])
+            try:
+                # Older users have hyphenated IDs, newer ones 32-char hex; accept either spelling of a UUID.
+                fallback_uuid = uuid.UUID(fallback_id)
+                user = User.query.filter(User.fallback_id.in_((fallback_uuid.hex, str(fallback_uuid)))).first()
+            except ValueError:
+                user = User.query.filter_by(fallback_id=fallback_id).first()
         elif data['identifier_type'] == 'phone':
             user = User.query.filter_by(phone=data['identifier_value']).first()
         else:
@@ -148,7 +164,7 @@ def checkin():
         db.session.commit()
         
         if notification_service:
-            notification_service.send_checkin_notifications(user, session_obj)
+            notification_service.send_checkin_notifications(user, session_obj, check_in_time)
         
         return jsonify({
             'status': 'success',
@@ -166,7 +182,13 @@ def checkin():
 @main_routes.route('/sync', methods=['POST'])
 def sync():
     current_app.logger.info(f"Accessed /sync endpoint with raw data: {request.data[:500]}")
-    data = request.get_json()
+    if orjson is not None and request.is_json:
+        try:
+            data = orjson.loads(request.get_data())
+        except orjson.JSONDecodeError:
+            data = None
+    else:
+        data = request.get_json()
     if not data:
         current_app.logger.error("/sync error: Request body must be JSON")
         return jsonify({'error': 'Request body must be JSON'}), 400
@@ -189,6 +211,11 @@ def sync():
 
         synced_checkin_responses = []
         new_user_responses = []
+        # New check-ins are collected as plain rows and written with one INSERT after the loop
+        pending_checkin_rows = []
+        pending_checkin_responses = []
+        pending_checkin_by_key = {}  # (user_id, session_id) -> response of the row queued for it
+        pending_duplicate_responses = []
 
         for reg_data in new_registrations_data:
             try:
@@ -322,28 +349,51 @@ def sync():
                     current_app.logger.warning(f"Sync: Invalid created_at_local format '{created_at_local_str}'. Using current UTC time.")
                     check_in_time_from_device = datetime.now(timezone.utc)
 
+                checkin_key = (user_for_checkin.id, session_for_checkin.id)
+                queued_checkin_response = pending_checkin_by_key.get(checkin_key)
+                if queued_checkin_response is not None:
+                    # Same user/session earlier in this payload; it gets that row's server ID once inserted
+                    current_app.logger.info(f"Sync: Duplicate check-in skipped for user {user_for_checkin.id} session {session_for_checkin.id}")
+                    duplicate_response = {'local_checkin_id': local_checkin_id, 'server_checkin_id': None, 'status': 'duplicate'}
+                    synced_checkin_responses.append(duplicate_response)
+                    pending_duplicate_responses.append((duplicate_response, queued_checkin_response))
+                    continue
+
                 existing_checkin = CheckIn.query.filter_by(user_id=user_for_checkin.id, session_id=session_for_checkin.id).first()
                 if existing_checkin:
                     current_app.logger.info(f"Sync: Duplicate check-in skipped for user {user_for_checkin.id} session {session_for_checkin.id}")
                     synced_checkin_responses.append({'local_checkin_id': local_checkin_id, 'server_checkin_id': existing_checkin.id, 'status': 'duplicate'})
                     continue
 
-                new_checkin_sync = CheckIn(
-                    user_id=user_for_checkin.id, session_id=session_for_checkin.id, event_id=event_for_checkin.id,
-                    device_id=str(device_uuid), is_synced=True,
-                    created_at_local=check_in_time_from_device,
-                    check_in_time=check_in_time_from_device,
-                    method=checkin_data.get('method', 'offline_sync')
-                )
-                db.session.add(new_checkin_sync)
-                db.session.flush()
-                synced_checkin_responses.append({'local_checkin_id': local_checkin_id, 'server_checkin_id': new_checkin_sync.id, 'status': 'synced'})
-                current_app.logger.info(f"Sync: Processed check-in for user {user_for_checkin.id} for session {session_for_checkin.id}, local_id {local_checkin_id}")
+                pending_checkin_rows.append({
+                    'user_id': user_for_checkin.id, 'session_id': session_for_checkin.id, 'event_id': event_for_checkin.id,
+                    'device_id': str(device_uuid), 'is_synced': True,
+                    'created_at_local': check_in_time_from_device,
+                    'check_in_time': check_in_time_from_device,
+                    'method': checkin_data.get('method', 'offline_sync')
+                })
+                checkin_response = {'local_checkin_id': local_checkin_id, 'server_checkin_id': None, 'status': 'synced'}
+                pending_checkin_responses.append(checkin_response)
+                pending_checkin_by_key[checkin_key] = checkin_response
+                synced_checkin_responses.append(checkin_response)
+                current_app.logger.info(f"Sync: Queued check-in for user {user_for_checkin.id} for session {session_for_checkin.id}, local_id {local_checkin_id}")
 
             except Exception as e_checkin_sync_item:
                 current_app.logger.error(f"Sync: Error processing an individual check-in data {checkin_data.get('local_id')}: {e_checkin_sync_item}", exc_info=True)
                 synced_checkin_responses.append({'local_checkin_id': checkin_data.get('local_id'), 'server_checkin_id': None, 'status': 'error', 'message': str(e_checkin_sync_item)})
 
+        if pending_checkin_rows:
+            # Single multi-row INSERT ... RETURNING instead of one CheckIn instance + flush per row.
+            # No CheckIn objects are created, so ORM mapper events don't fire for these rows.
+            inserted_checkin_ids = db.session.execute(
+                insert(CheckIn).returning(CheckIn.id, sort_by_parameter_order=True),
+                pending_checkin_rows
+            ).scalars().all()
+            for checkin_response, checkin_id in zip(pending_checkin_responses, inserted_checkin_ids):
+                checkin_response['server_checkin_id'] = checkin_id
+            for duplicate_response, queued_checkin_response in pending_duplicate_responses:
+                duplicate_response['server_checkin_id'] = queued_checkin_response['server_checkin_id']
+
         device.last_sync_time = datetime.now(timezone.utc)
         db.session.commit()
         current_app.logger.info("Sync: Successfully committed batch of check-ins and device update.")
@@ -1,66 +1,106 @@
-from cryptography.fernet import Fernet
+import functools
+import html
+import logging
 import os
-import africastalking # Make sure this is in requirements.txt and installed
-import resend         # Make sure this is in requirements.txt and installed
+import string
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone # Added timezone
-from dotenv import load_dotenv
+from flask import current_app
 
 # Import models carefully. If services are imported by models (circular), this can be an issue.
 # Usually, services use models, models don't use services.
-from .models import db, User, CheckIn, Registration, Event, Session # Added Event and Session
+from .models import db, User, Registration, Event, Session # Added Event and Session
+from .config import get_encryption_key_bytes, get_fernet_cipher
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
-# load_dotenv() # This is good if .env is in the same directory or a parent.
-# It's also loaded in config.py, so ensure consistency or load once.
-# For services, it's better if they get config from the app context or passed in.
-# For now, relying on os.getenv assuming .env is loaded by config.py when the app starts.
+# Get a logger for this module
+services_logger = logging.getLogger(__name__)
+
+# The .env file is loaded once, by config.py, when the app package is imported.
+# Services rely on os.getenv after that point rather than loading it again.
+
+# Check-in notifications (SMS/email API calls) run here so the request returns without waiting on them.
+_notification_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='checkin-notifications')
+
+# Email bodies, parsed once at import. Values are HTML-escaped before substitution.
+_CHECKIN_EMAIL_TEMPLATE = string.Template(
+    "<h1>Check-in Confirmed!</h1><p>Hello $name,</p><p>Your check-in to <strong>$event_name</strong> (Session: $session_name) "
+    "at $checkin_time has been confirmed.</p><p>Thank you for attending!</p>"
+)
+_VIP_ALERT_EMAIL_TEMPLATE = string.Template(
+    "<h1>VIP Attendee Checked In</h1><p><strong>Name:</strong> $name</p><p><strong>Phone:</strong> $phone</p>"
+    "<p><strong>Email:</strong> $email</p><p><strong>Event:</strong> $event_name</p><p><strong>Session:</strong> $session_name</p>"
+    "<p><strong>Check-in Time:</strong> $checkin_time</p>"
+)
 
 class FingerprintService:
     """Service for handling fingerprint operations"""
     def __init__(self):
-        key_str = os.getenv('ENCRYPTION_KEY')
-        if not key_str:
-            print("CRITICAL ERROR [FingerprintService]: ENCRYPTION_KEY not found in environment variables. Service will not function correctly.")
+        if not get_encryption_key_bytes():
+            services_logger.critical("FingerprintService: ENCRYPTION_KEY not found in environment variables. Service will not function correctly.")
             # In a real app, you might want to prevent app startup or have this service return a "disabled" state.
-            self.cipher = None # Set cipher to None if key is missing
-        else:
-            try:
-                self.cipher = Fernet(key_str.encode()) # Fernet key must be bytes
-            except Exception as e:
-                print(f"CRITICAL ERROR [FingerprintService]: Invalid ENCRYPTION_KEY. Could not initialize Fernet. Error: {e}")
-                self.cipher = None
+
+    @property
+    def cipher(self):
+        # Shared with the models and built lazily on first use; None if ENCRYPTION_KEY is missing or invalid.
+        return get_fernet_cipher()
 
     def encrypt_template(self, template_data: str) -> str | None:
-        if not self.cipher:
-            print("WARNING [FingerprintService]: Encryption attempted but cipher is not initialized (ENCRYPTION_KEY missing or invalid).")
+        cipher = self.cipher
+        if not cipher:
+            services_logger.warning("FingerprintService: Encryption attempted but cipher is not initialized (ENCRYPTION_KEY missing or invalid).")
             return None # Or return template_data if you want to store unencrypted (NOT RECOMMENDED)
         if not isinstance(template_data, str):
-             print(f"WARNING [FingerprintService]: template_data for encryption was not a string (type: {type(template_data)}). Will attempt to encode.")
+             services_logger.warning("FingerprintService: template_data for encryption was not a string (type: %s). Will attempt to encode.", type(template_data))
              # Attempt to convert to string then encode, or raise error
              template_data = str(template_data)
 
         try:
-            encrypted_data_bytes = self.cipher.encrypt(template_data.encode('utf-8'))
+            encrypted_data_bytes = cipher.encrypt(template_data.encode('utf-8'))
             return encrypted_data_bytes.decode('utf-8')
         except Exception as e:
-            print(f"ERROR [FingerprintService]: Encryption failed - {e}")
+            services_logger.error("FingerprintService: Encryption failed - %s", e)
             return None
 
 
     def decrypt_template(self, encrypted_template_str: str) -> str | None:
-        if not self.cipher:
-            print("WARNING [FingerprintService]: Decryption attempted but cipher is not initialized.")
+        cipher = self.cipher
+        if not cipher:
+            services_logger.warning("FingerprintService: Decryption attempted but cipher is not initialized.")
             return None # Or return encrypted_template_str
         if not encrypted_template_str:
             return None
         try:
-            decrypted_data_bytes = self.cipher.decrypt(encrypted_template_str.encode('utf-8'))
+            decrypted_data_bytes = cipher.decrypt(encrypted_template_str) # str tokens are accepted as-is
             return decrypted_data_bytes.decode('utf-8')
         except Exception as e: # Catch specific exceptions like InvalidToken from cryptography.fernet
-            print(f"ERROR [FingerprintService]: Decryption failed - {e}")
+            services_logger.error("FingerprintService: Decryption failed - %s", e)
             return None
 
 
+    def decrypt_many(self, encrypted_templates: list[str]) -> list[str | None]:
+        """Decrypts a batch of templates in one pass; empty or undecryptable entries come back as None."""
+        cipher = self.cipher
+        if not cipher:
+            services_logger.warning("FingerprintService: Batch decryption attempted but cipher is not initialized.")
+            return [None] * len(encrypted_templates)
+        # Hoisted out of the loop so each item costs only the decrypt itself
+        decrypt = cipher.decrypt
+        decrypted_templates = []
+        append = decrypted_templates.append
+        for encrypted_template_str in encrypted_templates:
+            if not encrypted_template_str:
+                append(None)
+                continue
+            try:
+                append(decrypt(encrypted_template_str).decode('utf-8'))
+            except Exception as e:
+                services_logger.error("FingerprintService: Decryption failed - %s", e)
+                append(None)
+        return decrypted_templates
+
+
     def match_templates(self, template1, template2, threshold=70):
         raise NotImplementedError("Fingerprint matching must be implemented with a specific SDK.")
 
@@ -76,82 +116,116 @@ class NotificationService:
         self.sms_service = None
         if self.at_username and self.at_api_key:
             try:
+                import africastalking # Imported only when SMS is configured (heavy SDK, see requirements.txt)
                 africastalking.initialize(username=self.at_username, api_key=self.at_api_key)
                 self.sms_service = africastalking.SMS
-                print("INFO [NotificationService]: Africa's Talking SMS service initialized.")
+                services_logger.info("NotificationService: Africa's Talking SMS service initialized.")
             except Exception as e:
-                print(f"WARNING [NotificationService]: Failed to initialize Africa's Talking SMS service: {e}")
+                services_logger.warning("NotificationService: Failed to initialize Africa's Talking SMS service: %s", e)
         else:
-            print("WARNING [NotificationService]: Africa's Talking credentials not fully set. SMS service disabled.")
+            services_logger.warning("NotificationService: Africa's Talking credentials not fully set. SMS service disabled.")
 
+        # Checked by the email senders instead of re-reading the module-level resend.api_key per send
+        self.email_enabled = False
+        self.resend = None
         if self.resend_api_key:
-            resend.api_key = self.resend_api_key
-            print("INFO [NotificationService]: Resend email service API key set.")
+            try:
+                import resend # Imported only when email is configured (see requirements.txt)
+                resend.api_key = self.resend_api_key
+                self.resend = resend
+                self.email_enabled = True
+                services_logger.info("NotificationService: Resend email service API key set.")
+            except ImportError as e:
+                services_logger.warning("NotificationService: Resend SDK not available. Email service disabled: %s", e)
         else:
-            print("WARNING [NotificationService]: Resend API key not set. Email service disabled for Resend.")
+            services_logger.warning("NotificationService: Resend API key not set. Email service disabled for Resend.")
+
+    def send_checkin_notifications(self, user: User, session_obj: Session, check_in_time: datetime | None = None): # Type hinting for clarity
+        """Queues the check-in notifications on the background executor and returns immediately."""
+        services_logger.debug("NotificationService: Queueing check-in notifications for user %s, session %s", user.id, session_obj.id)
+        # Only plain values cross the thread boundary; the worker loads its own instances in a fresh app context.
+        app = current_app._get_current_object()
+        _notification_executor.submit(self._send_checkin_notifications_in_background, app, user.id, session_obj.id, check_in_time)
 
-    def send_checkin_notifications(self, user: User, session_obj: Session): # Type hinting for clarity
-        print(f"INFO [NotificationService]: Attempting check-in notifications for user {user.id}, session {session_obj.id}")
-        self.send_checkin_sms(user, session_obj)
-        self.send_checkin_email(user, session_obj)
+    def _send_checkin_notifications_in_background(self, app, user_id, session_id, check_in_time):
+        with app.app_context():
+            try:
+                user = db.session.get(User, user_id)
+                # The event is needed for every message, so load it in the same query
+                session_obj = db.session.get(Session, session_id, options=[joinedload(Session.event)])
+                if not user or not session_obj:
+                    services_logger.warning("NotificationService: User %s or session %s not found. Skipping check-in notifications.", user_id, session_id)
+                    return
+                self._send_checkin_notifications_now(user, session_obj, check_in_time)
+            except Exception as e:
+                services_logger.exception("NotificationService: Background check-in notifications failed for user %s: %s", user_id, e)
+
+    def _send_checkin_notifications_now(self, user: User, session_obj: Session, check_in_time: datetime | None = None):
+        services_logger.debug("NotificationService: Attempting check-in notifications for user %s, session %s", user.id, session_obj.id)
+        # Resolved once and shared by all messages instead of each sender walking session_obj.event
+        event_name = session_obj.event.name if session_obj.event else "the event"
+        self.send_checkin_sms(user, session_obj, event_name=event_name)
+        self.send_checkin_email(user, session_obj, check_in_time, event_name=event_name)
         # Assuming VIP logic is handled elsewhere or based on user property
         if getattr(user, 'is_vip', False): # Example check for a hypothetical is_vip attribute
-             self.send_vip_alerts(user, session_obj)
+             self.send_vip_alerts(user, session_obj, check_in_time, event_name=event_name)
 
-    def send_checkin_sms(self, user: User, session_obj: Session):
+    def send_checkin_sms(self, user: User, session_obj: Session, event_name: str | None = None):
         if not self.sms_service:
-            print("DEBUG [NotificationService]: SMS service not available. Skipping SMS to user {user.id}.")
+            services_logger.debug("NotificationService: SMS service not available. Skipping SMS to user %s.", user.id)
             return None
         if not user.phone:
-            print(f"DEBUG [NotificationService]: No phone number for user {user.id}. Skipping SMS.")
+            services_logger.debug("NotificationService: No phone number for user %s. Skipping SMS.", user.id)
             return None
         try:
-            event_name = session_obj.event.name if session_obj.event else "the event"
+            if event_name is None:
+                event_name = session_obj.event.name if session_obj.event else "the event"
             message = f"Hello {user.name}, your check-in for {event_name} - {session_obj.name} is confirmed. Thank you!"
             # Ensure user.phone is in the correct international format if required by Africa's Talking
             response = self.sms_service.send(message, [str(user.phone)])
-            print(f"INFO [NotificationService]: SMS sent to {user.phone}. Response: {response}")
+            services_logger.debug("NotificationService: SMS sent to %s. Response: %s", user.phone, response)
             return response
         except Exception as e:
-            print(f"ERROR [NotificationService]: SMS sending failed for user {user.id}: {e}")
+            services_logger.error("NotificationService: SMS sending failed for user %s: %s", user.id, e)
             return None
 
-    def send_checkin_email(self, user: User, session_obj: Session):
-        if not resend.api_key: # Check if API key was set
-            print("DEBUG [NotificationService]: Resend API key not set. Skipping email to user {user.id}.")
+    def send_checkin_email(self, user: User, session_obj: Session, check_in_time: datetime | None = None, event_name: str | None = None):
+        if not self.email_enabled: # Check if API key was set
+            services_logger.debug("NotificationService: Resend API key not set. Skipping email to user %s.", user.id)
             return None
         if not user.email:
-            print(f"DEBUG [NotificationService]: No email address for user {user.id}. Skipping email.")
+            services_logger.debug("NotificationService: No email address for user %s. Skipping email.", user.id)
             return None
 
         try:
-            event_name = session_obj.event.name if session_obj.event else "the event"
+            if event_name is None:
+                event_name = session_obj.event.name if session_obj.event else "the event"
             session_name = session_obj.name
-            # Querying CheckIn time here might be complex if not passed directly.
-            # For simplicity, let's assume checkin_time is on session_obj or passed if needed for email content
-            # Or query it:
-            checkin_record = CheckIn.query.filter_by(user_id=user.id, session_id=session_obj.id).order_by(CheckIn.check_in_time.desc()).first()
-            checkin_time_display = checkin_record.check_in_time.strftime('%Y-%m-%d %H:%M') if checkin_record else "recently"
+            # The caller passes the time of the check-in it just recorded, so no CheckIn query is needed here
+            checkin_time_display = check_in_time.strftime('%Y-%m-%d %H:%M') if check_in_time else "recently"
 
             params = {
                 "from": self.from_email,
                 "to": [user.email],
                 "subject": f"Your Check-in Confirmation for {event_name}",
-                "html": f"<h1>Check-in Confirmed!</h1><p>Hello {user.name},</p><p>Your check-in to <strong>{event_name}</strong> (Session: {session_name}) at {checkin_time_display} has been confirmed.</p><p>Thank you for attending!</p>"
+                "html": _CHECKIN_EMAIL_TEMPLATE.substitute(
+                    name=html.escape(str(user.name)), event_name=html.escape(str(event_name)),
+                    session_name=html.escape(str(session_name)), checkin_time=checkin_time_display
+                )
             }
-            email_response = resend.Emails.send(params)
-            print(f"INFO [NotificationService]: Email sent to {user.email}. Response: {email_response}")
+            email_response = self.resend.Emails.send(params)
+            services_logger.debug("NotificationService: Email sent to %s. Response: %s", user.email, email_response)
             return email_response
         except Exception as e:
-            print(f"ERROR [NotificationService]: Email sending failed for user {user.id}: {e}")
+            services_logger.error("NotificationService: Email sending failed for user %s: %s", user.id, e)
             return None
 
-    def send_vip_alerts(self, user: User, session_obj: Session):
-        if not resend.api_key:
-            print("DEBUG [NotificationService]: Resend API key not set for VIP alert. Skipping.")
+    def send_vip_alerts(self, user: User, session_obj: Session, check_in_time: datetime | None = None, event_name: str | None = None):
+        if not self.email_enabled:
+            services_logger.debug("NotificationService: Resend API key not set for VIP alert. Skipping.")
             return None
         if not self.admin_email:
-            print("DEBUG [NotificationService]: ADMIN_EMAIL not set for VIP alert. Skipping.")
+            services_logger.debug("NotificationService: ADMIN_EMAIL not set for VIP alert. Skipping.")
             return None
         
         # Example: Add a check for VIP status if you have such a field in your User model
@@ -159,36 +233,52 @@ class NotificationService:
         #     return None
 
         try:
-            event_name = session_obj.event.name if session_obj.event else "the event"
+            if event_name is None:
+                event_name = session_obj.event.name if session_obj.event else "the event"
             session_name = session_obj.name
-            checkin_record = CheckIn.query.filter_by(user_id=user.id, session_id=session_obj.id).order_by(CheckIn.check_in_time.desc()).first()
-            checkin_time_display = checkin_record.check_in_time.strftime('%Y-%m-%d %H:%M UTC') if checkin_record else datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+            checkin_time_display = (check_in_time or datetime.now(timezone.utc)).strftime('%Y-%m-%d %H:%M UTC')
 
             params = {
                 "from": self.from_email,
                 "to": [self.admin_email],
                 "subject": f"VIP Check-in Alert: {user.name} for {event_name}",
-                "html": f"<h1>VIP Attendee Checked In</h1><p><strong>Name:</strong> {user.name}</p><p><strong>Phone:</strong> {user.phone}</p><p><strong>Email:</strong> {user.email or 'N/A'}</p><p><strong>Event:</strong> {event_name}</p><p><strong>Session:</strong> {session_name}</p><p><strong>Check-in Time:</strong> {checkin_time_display}</p>"
+                "html": _VIP_ALERT_EMAIL_TEMPLATE.substitute(
+                    name=html.escape(str(user.name)), phone=html.escape(str(user.phone)), email=html.escape(user.email or 'N/A'),
+                    event_name=html.escape(str(event_name)), session_name=html.escape(str(session_name)), checkin_time=checkin_time_display
+                )
             }
-            alert_response = resend.Emails.send(params)
-            print(f"INFO [NotificationService]: VIP Alert for {user.name} sent to {self.admin_email}. Response: {alert_response}")
+            alert_response = self.resend.Emails.send(params)
+            services_logger.debug("NotificationService: VIP Alert for %s sent to %s. Response: %s", user.name, self.admin_email, alert_response)
             return alert_response
         except Exception as e:
-            print(f"ERROR [NotificationService]: VIP alert email failed for user {user.id}: {e}")
+            services_logger.error("NotificationService: VIP alert email failed for user %s: %s", user.id, e)
             return None
 
 
+# Process-wide service instances. Both services only read configuration when they are built,
+# so every caller (routes, SyncService) can share a single instance.
+@functools.lru_cache(maxsize=1)
+def get_fingerprint_service():
+    """Returns the shared FingerprintService instance."""
+    return FingerprintService()
+
+@functools.lru_cache(maxsize=1)
+def get_notification_service():
+    """Returns the shared NotificationService instance."""
+    return NotificationService()
+
+
 class SyncService:
     """Service for handling offline sync operations"""
     def __init__(self):
         # Initialize FingerprintService here or ensure it's passed if needed by its methods
         try:
-            self.fingerprint_service = FingerprintService()
+            self.fingerprint_service = get_fingerprint_service()
         except ValueError as e: # Handles missing ENCRYPTION_KEY
-            print(f"WARNING [SyncService]: Could not initialize internal FingerprintService: {e}. Fingerprint operations in sync will be affected.")
+            services_logger.warning("SyncService: Could not initialize internal FingerprintService: %s. Fingerprint operations in sync will be affected.", e)
             self.fingerprint_service = None
         except Exception as e_fp_sync:
-            print(f"ERROR [SyncService]: Unexpected error initializing internal FingerprintService: {e_fp_sync}")
+            services_logger.error("SyncService: Unexpected error initializing internal FingerprintService: %s", e_fp_sync)
             self.fingerprint_service = None
 
 
@@ -197,7 +287,7 @@ class SyncService:
         # This service method could be called by that route, or the route could
         # use more granular methods from this service if you break down the sync logic.
         # For now, as per your routes.py, this service isn't directly orchestrating the whole sync.
-        print(f"INFO [SyncService]: process_sync_data called for device_id: {device_id}. Payload (first 200 chars): {str(sync_data_payload)[:200]}")
+        services_logger.info("SyncService: process_sync_data called for device_id: %s. Payload (first 200 chars): %.200s", device_id, sync_data_payload)
         # Example of how you might call helper methods if you refactor /sync route's logic here:
         # new_users_feedback = []
         # for reg_data in sync_data_payload.get('new_registrations', []):
@@ -1,48 +1,52 @@
 import sqlite3
 import os
 
-# Get the directory where this script itself is located (should be 'backend')
-script_dir = os.path.dirname(__file__) 
 
-# Construct the path to the database file inside the 'instance' subfolder
-db_path = os.path.join(script_dir, 'instance', 'dev_app.db')
+def main():
+    # Get the directory where this script itself is located (should be 'backend')
+    script_dir = os.path.dirname(__file__)
 
-print(f"Attempting to connect to SQLite database at: {db_path}")
+    # Construct the path to the database file inside the 'instance' subfolder
+    db_path = os.path.join(script_dir, 'instance', 'dev_app.db')
 
-if not os.path.exists(db_path):
-    print(f"ERROR: Database file not found at {db_path}")
-    print("Please ensure that `flask db upgrade` has run successfully and that the database file exists in the 'instance' folder within your backend directory.")
-else:
+    print(f"Attempting to connect to SQLite database at: {db_path}")
+
+    if not os.path.exists(db_path):
+        print(f"ERROR: Database file not found at {db_path}")
+        print("Please ensure that `flask db upgrade` has run successfully and that the database file exists in the 'instance' folder within your backend directory.")
+        return
+
+    conn = None
     try:
         # Connect to the SQLite database
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
+        # Rows are streamed from the cursor (fetched in batches of this size) rather than loaded all at once
+        cursor.arraysize = 1000
 
         print("\n--- Users Table Contents ---")
         # Execute a query to select all data from the users table
         cursor.execute("SELECT * FROM users")
-        rows = cursor.fetchall()
-
-        if rows:
-            # Get column names
-            column_names = [description[0] for description in cursor.description]
-            print(column_names)
-            for row in rows:
-                print(row)
-        else:
+
+        found_rows = False
+        for row in cursor:
+            if not found_rows:
+                # Get column names
+                column_names = [description[0] for description in cursor.description]
+                print(column_names)
+                found_rows = True
+            print(row)
+
+        if not found_rows:
             print("No data found in the users table. (This is normal if you haven't registered any users yet from your frontend).")
 
         # You can also check other tables, e.g., registrations:
         # print("\n--- Registrations Table Contents ---")
         # cursor.execute("SELECT * FROM registrations")
-        # reg_rows = cursor.fetchall()
-        # if reg_rows:
-        #     reg_column_names = [description[0] for description in cursor.description]
-        #     print(reg_column_names)
-        #     for reg_row in reg_rows:
-        #         print(reg_row)
-        # else:
-        #     print("No data found in the registrations table.")
+        # reg_column_names = [description[0] for description in cursor.description]
+        # print(reg_column_names)
+        # for reg_row in cursor:
+        #     print(reg_row)
 
     except sqlite3.Error as e:
         print(f"SQLite error: {e}")
@@ -50,4 +54,8 @@ else:
         # Close the connection
         if conn:
             conn.close()
-            print("\nDatabase connection closed.")
\ No newline at end of file
+            print("\nDatabase connection closed.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Server-side defaults for insert timestamps
+
+Revision ID: 3b7e5c1d9a42
+Revises: 08c4def914b7
+Create Date: 2026-10-15 09:12:40.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e5c1d9a42'
+down_revision = '08c4def914b7'
+branch_labels = None
+depends_on = None
+
+
+def _utc_now():
+    # The columns are naive UTC; PostgreSQL's now() would follow the session TimeZone, SQLite's is already UTC.
+    if op.get_context().dialect.name == 'postgresql': # works for --sql (offline) runs too
+        return sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)")
+    return sa.text('CURRENT_TIMESTAMP')
+
+
+def upgrade():
+    utc_now = _utc_now()
+    # batch_alter_table so the same migration also runs on local SQLite databases
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), server_default=utc_now, existing_nullable=True)
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), server_default=utc_now, existing_nullable=True)
+
+    with op.batch_alter_table('registrations', schema=None) as batch_op:
+        batch_op.alter_column('registration_date', existing_type=sa.DateTime(), server_default=utc_now, existing_nullable=True)
+
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.alter_column('check_in_time', existing_type=sa.DateTime(), server_default=utc_now, existing_nullable=True)
+
+    with op.batch_alter_table('offline_devices', schema=None) as batch_op:
+        batch_op.alter_column('last_seen', existing_type=sa.DateTime(), server_default=utc_now, existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('offline_devices', schema=None) as batch_op:
+        batch_op.alter_column('last_seen', existing_type=sa.DateTime(), server_default=None, existing_nullable=True)
+
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.alter_column('check_in_time', existing_type=sa.DateTime(), server_default=None, existing_nullable=True)
+
+    with op.batch_alter_table('registrations', schema=None) as batch_op:
+        batch_op.alter_column('registration_date', existing_type=sa.DateTime(), server_default=None, existing_nullable=True)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), server_default=None, existing_nullable=True)
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), server_default=None, existing_nullable=True)
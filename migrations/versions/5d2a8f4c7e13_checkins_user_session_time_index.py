@@ -0,0 +1,26 @@
+"""Composite index on check_ins (user_id, session_id, check_in_time DESC)
+
+Revision ID: 5d2a8f4c7e13
+Revises: 3b7e5c1d9a42
+Create Date: 2026-10-15 10:03:17.264915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2a8f4c7e13'
+down_revision = '3b7e5c1d9a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.create_index('ix_checkins_user_session_time', ['user_id', 'session_id', sa.text('check_in_time DESC')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.drop_index('ix_checkins_user_session_time')
@@ -9,6 +9,8 @@ pip install -r requirements.txt
 # Set FLASK_APP and FLASK_CONFIG for the migration command
 export FLASK_APP="app:create_app"
 export FLASK_CONFIG="prod"
+# Migrations don't serve requests, so skip importing the routes (and initializing their services)
+export SKIP_BLUEPRINTS="1"
 
 echo "INFO [render_build.sh]: FLASK_CONFIG is ${FLASK_CONFIG}"
 echo "INFO [render_build.sh]: About to run database migrations (flask db upgrade)..."